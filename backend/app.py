@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 from flask_cors import CORS
 from neo4j_crud import neo4jCRUD
+from similarity_index import SimilarityIndex, IndexNotReady
 from dotenv import load_dotenv
 import os
 from functools import wraps
@@ -15,6 +16,9 @@ app.config["JWT_HEADER_TYPE"] = ""
 CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173"}})
 jwt = JWTManager(app)
 db = neo4jCRUD()
+similar_index = SimilarityIndex()
+
+CUENTA_ELIMINANDOSE = "Tu cuenta se está eliminando"
 
 def admin_required(fn):
     @wraps(fn)
@@ -40,8 +44,14 @@ def register():
         if rol not in ['usuario', 'admin']:
             return jsonify({"error": "Rol inválido"}), 400
 
-        # Verificar si el usuario ya existe
-        if db.execute_query("MATCH (u:Usuario {email: $email}) RETURN u", {"email": data['email']}):
+        # Verificar si el usuario ya existe (o se está eliminando)
+        existente = db.execute_query(
+            "MATCH (u:Usuario {email: $email}) RETURN coalesce(u.eliminado, false) AS eliminado",
+            {"email": data['email']}
+        )
+        if existente:
+            if existente[0].get('eliminado'):
+                return jsonify({"error": "El usuario se está eliminando, inténtalo más tarde"}), 409
             return jsonify({"error": "El usuario ya existe"}), 409
 
         # Crear usuario con contraseña hasheada y rol
@@ -64,7 +74,7 @@ def login():
 
         # Obtener el rol del usuario
         user_info = db.execute_query(
-            "MATCH (u:Usuario {email: $email}) RETURN u.name AS name, u.rol AS rol", 
+            "MATCH (u:Usuario {email: $email}) WHERE NOT coalesce(u.eliminado, false) RETURN u.name AS name, u.rol AS rol", 
             {"email": data['email']}
         )
         if not user_info:
@@ -98,10 +108,11 @@ def get_current_user():
         user_data = db.execute_query(
             """
             MATCH (u:Usuario {email: $email})
+            WHERE NOT coalesce(u.eliminado, false)
             RETURN {
                 name: u.name,
                 email: u.email,
-                preferences: [(u)-[:LE_GUSTA]->(a) | a.nombre]
+                preferences: [(u)-[:LE_GUSTA]->(a) WHERE NOT coalesce(a.eliminado, false) | a.nombre]
             } AS user
             """,
             {"email": email}
@@ -124,18 +135,15 @@ def get_current_user():
 def delete_current_user():
     try:
         email = get_jwt_identity()
-        # Eliminar usuario y todas sus relaciones
-        db.execute_query(
-            """
-            MATCH (u:Usuario {email: $email})
-            DETACH DELETE u
-            """,
-            {"email": email}
-        )
+        # Ocultar al usuario y eliminar sus relaciones por lotes en segundo plano
+        job_id = db.start_delete_job("usuario", email, email)
+        if not job_id:
+            return jsonify({"error": "Usuario no encontrado"}), 404
         return jsonify({
-            "status": "success",
-            "message": "Usuario eliminado correctamente"
-        }), 200
+            "status": "accepted",
+            "message": "Eliminación del usuario en curso",
+            "job_id": job_id
+        }), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -155,6 +163,9 @@ def create_activity():
             pattern = r"^\d{2}/\d{2}/\d{2} \d{1,2}:\d{2}(am|pm)$"
             if not re.match(pattern, time.lower()):
                 return jsonify({"error": "El campo 'time' debe tener formato dd/mm/yy h:mmam o h:mmpm, ejemplo: 02/06/25 2:00pm"}), 400
+        # No reutilizar una actividad que se está eliminando
+        if db.is_being_deleted("actividad", data['nombre']):
+            return jsonify({"error": "La actividad se está eliminando, inténtalo más tarde"}), 409
         result = db.create_activity(
             data['nombre'],
             place,
@@ -164,7 +175,7 @@ def create_activity():
 
         node = result[0]['a']
         activity = dict(node.items())
-
+        similar_index.add(activity.get('nombre'), activity.get('category'))
 
         return jsonify({
             "status": "success",
@@ -179,9 +190,11 @@ def get_activities():
         activities = db.execute_query(
             """
             MATCH (a:Actividad)
+            WHERE NOT coalesce(a.eliminado, false)
             OPTIONAL MATCH (a)-[:PERTENECE_A]->(c:Categoria)
             RETURN a, c.nombre AS categoria
-            """
+            """,
+            coalesce=True
         )
 
         grouped = {}
@@ -215,18 +228,40 @@ def get_activities():
 @app.route('/api/activities/<nombre>', methods=['DELETE'])
 @admin_required
 def delete_activity(nombre):
-    # Aquí podrías agregar lógica de admin si implementas roles
     try:
-        db.execute_query(
-            """
-            MATCH (a:Actividad {nombre: $nombre})
-            DETACH DELETE a
-            """,
-            {"nombre": nombre}
-        )
+        # Ocultar la actividad y eliminar sus relaciones por lotes en segundo plano
+        job_id = db.start_delete_job("actividad", nombre, get_jwt_identity())
+        if not job_id:
+            return jsonify({"error": f"Actividad '{nombre}' no encontrada"}), 404
+        similar_index.remove(nombre)
+        return jsonify({
+            "status": "accepted",
+            "message": f"Eliminación de la actividad '{nombre}' en curso",
+            "job_id": job_id
+        }), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ---- ACTIVIDADES SIMILARES ----
+@app.route('/api/activities/<nombre>/similar', methods=['GET'])
+def get_similar_activities(nombre):
+    try:
+        k = request.args.get('k', '10')
+        if not re.fullmatch(r"\d+", k) or not 1 <= int(k) <= similar_index.max_neighbors:
+            return jsonify({"error": f"El parámetro 'k' debe ser un entero entre 1 y {similar_index.max_neighbors}"}), 400
+        k = int(k)
+
+        try:
+            similares = similar_index.similar(db, nombre, k)
+        except IndexNotReady:
+            return jsonify({"error": "El índice de actividades similares se está construyendo, inténtalo más tarde"}), 503
+        if similares is None:
+            return jsonify({"error": f"Actividad '{nombre}' no encontrada"}), 404
+
         return jsonify({
             "status": "success",
-            "message": f"Actividad '{nombre}' eliminada"
+            "count": len(similares),
+            "data": similares
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -240,6 +275,7 @@ def get_my_preferences():
         preferences = db.execute_query(
             """
             MATCH (u:Usuario {email: $email})-[:LE_GUSTA]->(a:Actividad)
+            WHERE NOT coalesce(u.eliminado, false) AND NOT coalesce(a.eliminado, false)
             OPTIONAL MATCH (a)-[:PERTENECE_A]->(c:Categoria)
             RETURN a.nombre AS actividad, c.nombre AS categoria
             """,
@@ -274,11 +310,14 @@ def add_preferences():
         actividades_input = data.get('actividades')
         if not actividades_input or not isinstance(actividades_input, list):
             return jsonify({"error": "El campo 'actividades' debe ser una lista válida"}), 400
+        if db.is_being_deleted("usuario", email):
+            return jsonify({"error": CUENTA_ELIMINANDOSE}), 409
 
         # Obtener todas las actividades registradas
         actividadesExistentes = db.execute_query(
             """
             MATCH (a:Actividad)
+            WHERE NOT coalesce(a.eliminado, false)
             RETURN a.nombre AS nombre
             """
         )
@@ -297,7 +336,9 @@ def add_preferences():
             db.execute_query(
                 """
                 MATCH (u:Usuario {email: $email})
+                WHERE NOT coalesce(u.eliminado, false)
                 MATCH (a:Actividad {nombre: $actividad})
+                WHERE NOT coalesce(a.eliminado, false)
                 MERGE (u)-[:LE_GUSTA]->(a)
                 """,
                 {"email": email, "actividad": actividad}
@@ -318,9 +359,12 @@ def add_preferences():
 def delete_preference(actividad):
     try:
         email = get_jwt_identity()
+        if db.is_being_deleted("usuario", email):
+            return jsonify({"error": CUENTA_ELIMINANDOSE}), 409
         db.execute_query(
             """
             MATCH (u:Usuario {email: $email})-[r:LE_GUSTA]->(a:Actividad {nombre: $actividad})
+            WHERE NOT coalesce(u.eliminado, false)
             DELETE r
             """,
             {"email": email, "actividad": actividad}
@@ -342,14 +386,18 @@ def get_recommendations():
         recommendations = db.execute_query(
             """
             MATCH (me:Usuario {email: $email})-[:LE_GUSTA]->(a1:Actividad)
+            WHERE NOT coalesce(me.eliminado, false)
             WITH me, collect(a1) AS mis_actividades
             MATCH (me)-[:LE_GUSTA]->(a:Actividad)<-[:LE_GUSTA]-(other:Usuario)-[:LE_GUSTA]->(rec:Actividad)
             WHERE NOT rec IN mis_actividades AND other.email <> $email
+              AND NOT coalesce(a.eliminado, false)
+              AND NOT coalesce(rec.eliminado, false) AND NOT coalesce(other.eliminado, false)
             OPTIONAL MATCH (rec)-[:PERTENECE_A]->(c:Categoria)
             RETURN DISTINCT rec.nombre AS actividad, c.nombre AS categoria
             LIMIT 10
             """,
-            {"email": email}
+            {"email": email},
+            coalesce=True
         )
         # Agrupar recomendaciones por categoría
         grouped = {}
@@ -375,11 +423,15 @@ def get_recommendations():
 def like_activity(nombre):
     try:
         email = get_jwt_identity()
+        if db.is_being_deleted("usuario", email):
+            return jsonify({"error": CUENTA_ELIMINANDOSE}), 409
         # Crear relación LE_GUSTA si no existe
         db.execute_query(
             '''
             MATCH (u:Usuario {email: $email})
+            WHERE NOT coalesce(u.eliminado, false)
             MATCH (a:Actividad {nombre: $nombre})
+            WHERE NOT coalesce(a.eliminado, false)
             MERGE (u)-[:LE_GUSTA]->(a)
             ''',
             {"email": email, "nombre": nombre}
@@ -396,10 +448,13 @@ def like_activity(nombre):
 def unlike_activity(nombre):
     try:
         email = get_jwt_identity()
+        if db.is_being_deleted("usuario", email):
+            return jsonify({"error": CUENTA_ELIMINANDOSE}), 409
         # Eliminar relación LE_GUSTA si existe
         db.execute_query(
             '''
             MATCH (u:Usuario {email: $email})-[r:LE_GUSTA]->(a:Actividad {nombre: $nombre})
+            WHERE NOT coalesce(u.eliminado, false)
             DELETE r
             ''',
             {"email": email, "nombre": nombre}
@@ -411,5 +466,35 @@ def unlike_activity(nombre):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# ---- TRABAJOS DE ELIMINACIÓN ----
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_delete_job(job_id):
+    try:
+        job = db.get_delete_job(job_id)
+        # Solo el solicitante o un admin pueden consultar el trabajo
+        if not job or (job.get('solicitante') != get_jwt_identity() and get_jwt().get('rol') != 'admin'):
+            return jsonify({"error": "Trabajo no encontrado"}), 404
+        return jsonify({
+            "status": "success",
+            "data": job
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# ---- MÉTRICAS (solo admin) ----
+@app.route('/api/metrics/single-flight', methods=['GET'])
+@admin_required
+def get_single_flight_metrics():
+    # Contadores del proceso que atiende la petición (cada worker lleva los suyos)
+    try:
+        return jsonify({
+            "status": "success",
+            "data": db.single_flight.stats()
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
+    db.start_delete_job_recovery()
     app.run(host='127.0.0.1', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,173 @@
+# Benchmark de escalado de GET /api/activities con gunicorn.
+#
+# Levanta el servidor de producción con 1, 2, 4, ... workers (hasta el número
+# de núcleos reservados para el servidor), lo satura con varios procesos
+# cliente durante unos segundos y muestra el throughput y la eficiencia
+# respecto a un solo worker.
+#
+# Servidor y clientes se fijan a conjuntos de CPUs distintos: si compartieran
+# núcleos, los clientes le quitarían CPU a los workers y el escalado medido no
+# sería el del servidor. Por defecto se usa la primera mitad de las CPUs
+# disponibles para gunicorn y la otra mitad para los clientes. Neo4j debería
+# correr en otra máquina (o en CPUs fuera de ambos conjuntos).
+# Necesita Neo4j corriendo y el .env configurado, igual que la API. Solo Linux.
+#
+# Uso (desde la carpeta backend):
+#   python bench/bench_activities.py --duration 10 --server-cpus 0-7 --client-cpus 8-15
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH = '/api/activities'
+
+
+def parse_cpus(value):
+    """Convierte una lista de CPUs como '0-3,6' en un conjunto de enteros."""
+    cpus = set()
+    for part in value.split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def positive_int(value):
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError("debe ser un entero >= 1")
+    return n
+
+
+def _client(url, deadline, threads, cpus, queue):
+    os.sched_setaffinity(0, cpus)
+    # Cada proceso cliente usa varios hilos para no quedar limitado por el GIL
+    def loop():
+        ok = errors = 0
+        while time.time() < deadline:
+            try:
+                with urllib.request.urlopen(url, timeout=10) as response:
+                    response.read()
+                    ok += 1
+            except Exception:
+                errors += 1
+        return ok, errors
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda _: loop(), range(threads)))
+    queue.put((sum(r[0] for r in results), sum(r[1] for r in results)))
+
+
+def wait_until_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                response.read()
+                return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def run(workers, args):
+    env = dict(os.environ)
+    env.update({
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_THREADS": str(args.threads),
+        "GUNICORN_WORKER_CLASS": args.worker_class,
+        "GUNICORN_BIND": f"127.0.0.1:{args.port}",
+        "GUNICORN_ACCESSLOG": "",
+        "GUNICORN_LOGLEVEL": "warning",
+    })
+    # Los workers heredan la afinidad del maestro
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        cwd=BACKEND_DIR,
+        env=env,
+        preexec_fn=lambda: os.sched_setaffinity(0, args.server_cpus)
+    )
+    url = f"http://127.0.0.1:{args.port}{PATH}"
+    try:
+        if not wait_until_ready(url):
+            raise RuntimeError("El servidor no respondió a tiempo")
+        # Calentamiento: cada worker abre su pool de conexiones a Neo4j
+        for _ in range(workers * args.threads):
+            urllib.request.urlopen(url).read()
+
+        queue = multiprocessing.Queue()
+        deadline = time.time() + args.duration
+        clients = [
+            multiprocessing.Process(target=_client, args=(url, deadline, args.client_threads, args.client_cpus, queue))
+            for _ in range(args.clients)
+        ]
+        for c in clients:
+            c.start()
+        results = [queue.get() for _ in clients]
+        for c in clients:
+            c.join()
+        ok = sum(r[0] for r in results)
+        errors = sum(r[1] for r in results)
+        return ok / args.duration, errors
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Escalado de GET /api/activities con gunicorn')
+    available = sorted(os.sched_getaffinity(0))
+    half = len(available) // 2
+    parser.add_argument('--duration', type=positive_int, default=10, help='segundos por medición')
+    parser.add_argument('--server-cpus', type=parse_cpus, default=set(available[:half]),
+                        help='CPUs para gunicorn, ej. 0-7 (por defecto la primera mitad)')
+    parser.add_argument('--client-cpus', type=parse_cpus, default=set(available[half:]),
+                        help='CPUs para los clientes, ej. 8-15 (por defecto la segunda mitad)')
+    parser.add_argument('--clients', type=positive_int, help='procesos cliente (por defecto uno por CPU de cliente)')
+    parser.add_argument('--client-threads', type=positive_int, default=8, help='hilos por proceso cliente')
+    parser.add_argument('--threads', type=positive_int, default=4, help='hilos por worker de gunicorn')
+    parser.add_argument('--worker-class', choices=['gthread', 'gevent'], default='gthread')
+    parser.add_argument('--max-workers', type=positive_int,
+                        help='máximo de workers (por defecto y como tope, las CPUs del servidor)')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    if not args.server_cpus or not args.client_cpus:
+        parser.error("se necesitan al menos 2 CPUs para separar servidor y clientes")
+    if args.server_cpus & args.client_cpus:
+        parser.error("--server-cpus y --client-cpus no deben compartir CPUs")
+    if args.max_workers is None:
+        args.max_workers = len(args.server_cpus)
+    elif args.max_workers > len(args.server_cpus):
+        parser.error(f"--max-workers no puede superar las {len(args.server_cpus)} CPUs del servidor")
+    if args.clients is None:
+        args.clients = len(args.client_cpus)
+
+    counts = []
+    n = 1
+    while n <= args.max_workers:
+        counts.append(n)
+        n *= 2
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    print(f"GET {PATH} — {args.worker_class}, {args.threads} hilos/worker, {args.duration}s por medición")
+    print(f"CPUs servidor: {sorted(args.server_cpus)}, CPUs clientes: {sorted(args.client_cpus)}")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'eficiencia':>11} {'errores':>8}")
+    base = None
+    for workers in counts:
+        rps, errors = run(workers, args)
+        base = base or rps
+        speedup = rps / base if base else 0
+        print(f"{workers:>8} {rps:>10.1f} {speedup:>8.2f} {speedup / workers:>10.0%} {errors:>8}")
+
+
+if __name__ == '__main__':
+    main()
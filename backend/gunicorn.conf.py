@@ -0,0 +1,55 @@
+# Configuración de gunicorn para producción.
+# Uso (desde la carpeta backend):
+#   gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+# Tipo de worker: 'gthread' (hilos) o 'gevent' (corrutinas)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in ("gthread", "gevent"):
+    raise ValueError("GUNICORN_WORKER_CLASS debe ser 'gthread' o 'gevent'")
+
+if worker_class == "gevent":
+    # Con preload_app la aplicación se importa en el maestro, así que hay que
+    # parchear la librería estándar antes de que se importe neo4j
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Cargar la aplicación en el maestro antes del fork: los workers comparten
+# el código y los datos de solo lectura por copy-on-write
+preload_app = True
+
+# Hilos de fondo de cada worker que también usan Neo4j: el que ejecuta los
+# trabajos de eliminación, el que retoma los abandonados y el que reconstruye
+# el índice de actividades similares
+BACKGROUND_CONNECTIONS = 3
+
+# Cada worker atiende como máximo `threads` (o `worker_connections` con gevent)
+# peticiones a la vez; el pool reserva además una conexión por hilo de fondo
+# para que estos nunca dejen a una petición esperando conexión
+if "NEO4J_MAX_POOL_SIZE" not in os.environ:
+    concurrency = threads if worker_class == "gthread" else worker_connections
+    os.environ["NEO4J_MAX_POOL_SIZE"] = str(min(concurrency, 100) + BACKGROUND_CONNECTIONS)
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def post_fork(server, worker):
+    # El driver de Neo4j no sobrevive a un fork: se descarta la copia heredada
+    # y cada worker abre su propio pool de conexiones en la primera consulta
+    from app import db, similar_index
+    db.reset()
+    # Retomar eliminaciones que dejó a medias un worker que ya no existe
+    db.start_delete_job_recovery()
+    # Construir el índice de similares fuera de las peticiones
+    similar_index.start(db)
+    server.log.info("Worker %s listo (pid %s)", worker.age, worker.pid)
@@ -1,21 +1,141 @@
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import os
+import copy
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    El primer hilo que llega ejecuta la función; los que llegan mientras
+    tanto esperan y reciben el mismo resultado (o la misma excepción).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.collapsed += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                # Cada hilo lanza su propia copia: relanzar el mismo objeto
+                # reescribiría su traceback desde varios hilos a la vez
+                try:
+                    error = copy.copy(call.error)
+                except Exception:
+                    error = RuntimeError(f"La consulta compartida falló: {call.error}")
+                raise error from call.error
+            return list(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "collapsed": self.collapsed,
+                "in_flight": len(self._calls)
+            }
+
+# Nodos que se pueden eliminar en segundo plano: tipo -> (etiqueta, propiedad clave)
+DELETE_TARGETS = {
+    "actividad": ("Actividad", "nombre"),
+    "usuario": ("Usuario", "email")
+}
+
 class neo4jCRUD:
     def __init__(self):
         self.uri = os.getenv("NEO4J_URI")
         self.user = os.getenv("NEO4J_USER")
         self.password = os.getenv("NEO4J_PASSWORD")
-        self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+        self.max_pool_size = int(os.getenv("NEO4J_MAX_POOL_SIZE", "100"))
+        self.delete_batch_size = int(os.getenv("DELETE_BATCH_SIZE", "1000"))
+        self.delete_job_stale_seconds = int(os.getenv("DELETE_JOB_STALE_SECONDS", "120"))
+        self.delete_job_ttl_seconds = int(os.getenv("DELETE_JOB_TTL_SECONDS", "86400"))
+        self._driver = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.single_flight = SingleFlight()
+        self._reset_delete_queue()
+
+    @property
+    def driver(self):
+        # El driver se crea en el primer uso y se vuelve a crear si el proceso
+        # cambió (fork de un worker de gunicorn), así ningún worker comparte
+        # sockets del pool de conexiones con el proceso maestro.
+        if self._driver is None or self._pid != os.getpid():
+            with self._lock:
+                if self._driver is None or self._pid != os.getpid():
+                    self._driver = GraphDatabase.driver(
+                        self.uri,
+                        auth=(self.user, self.password),
+                        max_connection_pool_size=self.max_pool_size
+                    )
+                    self._pid = os.getpid()
+        return self._driver
+
+    def reset(self):
+        # Olvida el driver heredado sin cerrarlo: sus sockets pertenecen al proceso padre
+        self._lock = threading.Lock()
+        self.single_flight = SingleFlight()
+        self._reset_delete_queue()
+        self._driver = None
+        self._pid = None
 
     def close(self):
-        self.driver.close()
+        if self._driver is not None and self._pid == os.getpid():
+            self._driver.close()
+        self._driver = None
+        self._pid = None
+
+    def execute_query(self, query, parameters=None, coalesce=False):
+        # Con coalesce=True las lecturas idénticas concurrentes comparten una
+        # sola consulta a la base de datos. Solo para consultas de lectura.
+        if coalesce:
+            key = (query, json.dumps(parameters, sort_keys=True, default=str))
+            return self.single_flight.do(key, lambda: self._run(query, parameters))
+        return self._run(query, parameters)
 
-    def execute_query(self, query, parameters=None):
+    def _run(self, query, parameters=None):
         with self.driver.session() as session:
             result = session.run(query, parameters)
             return [record for record in result]
@@ -38,7 +158,7 @@ class neo4jCRUD:
 
     def verify_user(self, email, password):
         user = self.execute_query(
-            "MATCH (u:Usuario {email: $email}) RETURN u",
+            "MATCH (u:Usuario {email: $email}) WHERE NOT coalesce(u.eliminado, false) RETURN u",
             {"email": email}
         )
         if user and check_password_hash(user[0]['u']['password'], password):
@@ -68,6 +188,34 @@ class neo4jCRUD:
             "category": category
         })
 
+    def get_similarity_data(self):
+        """Actividades visibles como (nombre, categoria) y likes como (actividad, usuario)."""
+        actividades = self.execute_query("""
+        MATCH (a:Actividad)
+        WHERE NOT coalesce(a.eliminado, false)
+        OPTIONAL MATCH (a)-[:PERTENECE_A]->(c:Categoria)
+        WITH a, head(collect(c.nombre)) AS categoria
+        RETURN a.nombre AS nombre, coalesce(a.category, categoria) AS categoria
+        """)
+        likes = self.execute_query("""
+        MATCH (u:Usuario)-[:LE_GUSTA]->(a:Actividad)
+        WHERE NOT coalesce(a.eliminado, false) AND NOT coalesce(u.eliminado, false)
+        RETURN a.nombre AS actividad, u.email AS usuario
+        """)
+        return (
+            [(r['nombre'], r['categoria']) for r in actividades],
+            [(r['actividad'], r['usuario']) for r in likes]
+        )
+
+    def get_visible_activities(self, nombres):
+        """Subconjunto de nombres que corresponden a actividades no eliminadas."""
+        result = self.execute_query("""
+        MATCH (a:Actividad)
+        WHERE a.nombre IN $nombres AND NOT coalesce(a.eliminado, false)
+        RETURN a.nombre AS nombre
+        """, {"nombres": nombres})
+        return {r['nombre'] for r in result}
+
     # ---- PREFERENCES ----
     def add_preference_with_list(self, email, actividades):
         actividades_unicas = list(set(actividades))
@@ -81,4 +229,236 @@ class neo4jCRUD:
         return self.execute_query(query, {
             "email": email,
             "actividades": actividades_unicas
-        })
\ No newline at end of file
+        })
+
+    # ---- ELIMINACIONES EN SEGUNDO PLANO ----
+    # Cada trabajo guarda qué proceso lo ejecuta (propietario) y cuándo dio la
+    # última señal de vida (latido, en ms). Si el worker muere a mitad del
+    # borrado, el latido deja de avanzar y otro worker retoma el trabajo.
+    def _owner_id(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _reset_delete_queue(self):
+        # Los trabajos de cada worker se ejecutan de uno en uno en un único
+        # hilo; la cola y el hilo se crean en el primer trabajo del proceso
+        self._jobs_lock = threading.Lock()
+        self._jobs = None
+        self._jobs_pid = None
+        self._queued_jobs = set()
+
+    def _enqueue_delete_job(self, job_id, tipo, valor):
+        with self._jobs_lock:
+            if self._jobs_pid != os.getpid():
+                self._jobs = queue.Queue()
+                self._jobs_pid = os.getpid()
+                self._queued_jobs = set()
+                threading.Thread(target=self._delete_job_worker, args=(self._jobs,), daemon=True).start()
+            self._queued_jobs.add(job_id)
+            self._jobs.put((job_id, tipo, valor))
+
+    def _delete_job_worker(self, jobs):
+        while True:
+            job_id, tipo, valor = jobs.get()
+            with self._jobs_lock:
+                self._queued_jobs.discard(job_id)
+            self._run_delete_job(job_id, tipo, valor)
+
+    def _touch_queued_delete_jobs(self):
+        # Los trabajos que esperan en la cola no avanzan su latido: se renueva
+        # aquí para que otro worker no los dé por abandonados mientras este vive
+        with self._jobs_lock:
+            ids = list(self._queued_jobs) if self._jobs_pid == os.getpid() else []
+        if ids:
+            self.execute_query(
+                "MATCH (j:TrabajoEliminacion) WHERE j.id IN $ids SET j.latido = timestamp()",
+                {"ids": ids}
+            )
+
+    def start_delete_job(self, tipo, valor, solicitante):
+        """Marca el nodo como eliminado y encola el borrado por lotes.
+
+        Devuelve el id del trabajo (el ya existente si el nodo se está
+        eliminando), o None si el nodo no existe.
+        """
+        label, key = DELETE_TARGETS[tipo]
+        job_id = uuid.uuid4().hex
+        # El SET inicial bloquea el nodo: dos peticiones simultáneas no pueden
+        # crear dos trabajos para el mismo objetivo
+        result = self.execute_query(f"""
+        MATCH (n:{label} {{{key}: $valor}})
+        SET n.eliminado = true
+        WITH n
+        OPTIONAL MATCH (activo:TrabajoEliminacion {{tipo: $tipo, objetivo: $valor}})
+        WHERE activo.estado IN ['pendiente', 'en_progreso']
+        WITH n, head(collect(activo.id)) AS existente
+        FOREACH (crear IN CASE WHEN existente IS NULL THEN [1] ELSE [] END |
+            CREATE (:TrabajoEliminacion {{
+                id: $id,
+                tipo: $tipo,
+                objetivo: $valor,
+                solicitante: $solicitante,
+                estado: 'pendiente',
+                relaciones_eliminadas: 0,
+                propietario: $propietario,
+                latido: timestamp(),
+                creado: toString(datetime())
+            }})
+        )
+        RETURN coalesce(existente, $id) AS id, existente IS NULL AS nuevo
+        """, {"id": job_id, "tipo": tipo, "valor": valor, "solicitante": solicitante,
+              "propietario": self._owner_id()})
+        if not result:
+            return None
+        if result[0]['nuevo']:
+            self._enqueue_delete_job(job_id, tipo, valor)
+        return result[0]['id']
+
+    def is_being_deleted(self, tipo, valor):
+        """True si el nodo existe pero está marcado como eliminado."""
+        label, key = DELETE_TARGETS[tipo]
+        return bool(self.execute_query(
+            f"MATCH (n:{label} {{{key}: $valor}}) WHERE n.eliminado = true RETURN n.{key} AS valor",
+            {"valor": valor}
+        ))
+
+    def get_delete_job(self, job_id):
+        result = self.execute_query(
+            "MATCH (j:TrabajoEliminacion {id: $id}) RETURN properties(j) AS job",
+            {"id": job_id}
+        )
+        return result[0]['job'] if result else None
+
+    def _update_delete_job(self, job_id, estado, eliminadas, error=None):
+        self.execute_query("""
+        MATCH (j:TrabajoEliminacion {id: $id})
+        SET j.estado = $estado,
+            j.relaciones_eliminadas = $eliminadas,
+            j.error = $error,
+            j.latido = timestamp(),
+            j.finalizado = CASE WHEN $estado IN ['completado', 'error'] THEN timestamp() ELSE NULL END
+        """, {"id": job_id, "estado": estado, "eliminadas": eliminadas, "error": error})
+
+    def _run_delete_job(self, job_id, tipo, valor, eliminadas=0):
+        # Cada lote es una transacción pequeña: se borran como mucho
+        # delete_batch_size relaciones por consulta y al final el nodo
+        label, key = DELETE_TARGETS[tipo]
+        try:
+            self._update_delete_job(job_id, 'en_progreso', eliminadas)
+            while True:
+                result = self.execute_query(f"""
+                MATCH (n:{label} {{{key}: $valor}})-[r]-()
+                WHERE n.eliminado = true
+                WITH r LIMIT $batch
+                DELETE r
+                RETURN count(r) AS eliminadas
+                """, {"valor": valor, "batch": self.delete_batch_size})
+                lote = result[0]['eliminadas'] if result else 0
+                if lote == 0:
+                    break
+                eliminadas += lote
+                self._update_delete_job(job_id, 'en_progreso', eliminadas)
+            self.execute_query(f"""
+            MATCH (n:{label} {{{key}: $valor}})
+            WHERE n.eliminado = true
+            DETACH DELETE n
+            """, {"valor": valor})
+            self._update_delete_job(job_id, 'completado', eliminadas)
+        except Exception as e:
+            logger.exception("Falló el trabajo de eliminación %s (%s %s)", job_id, tipo, valor)
+            try:
+                self._update_delete_job(job_id, 'error', eliminadas, str(e))
+            except Exception:
+                # Si Neo4j es la causa del fallo, el trabajo queda en_progreso
+                # y lo retomará la recuperación cuando su latido caduque
+                logger.exception("No se pudo registrar el error del trabajo %s", job_id)
+
+    def ensure_activity_schema(self):
+        # Casi todas las consultas buscan actividades por nombre (entre ellas
+        # get_visible_activities en cada petición de similares)
+        try:
+            self.execute_query(
+                "CREATE CONSTRAINT actividad_nombre IF NOT EXISTS "
+                "FOR (a:Actividad) REQUIRE a.nombre IS UNIQUE"
+            )
+        except Exception:
+            # Con nombres duplicados la restricción no se puede crear: al menos un índice
+            logger.warning("No se pudo crear la restricción única de Actividad.nombre; se crea un índice", exc_info=True)
+            self.execute_query(
+                "CREATE INDEX actividad_nombre_idx IF NOT EXISTS FOR (a:Actividad) ON (a.nombre)"
+            )
+
+    def ensure_delete_job_schema(self):
+        # Todas las consultas de trabajos buscan por id, estado u objetivo
+        self.execute_query(
+            "CREATE CONSTRAINT trabajo_eliminacion_id IF NOT EXISTS "
+            "FOR (j:TrabajoEliminacion) REQUIRE j.id IS UNIQUE"
+        )
+        self.execute_query(
+            "CREATE INDEX trabajo_eliminacion_estado IF NOT EXISTS "
+            "FOR (j:TrabajoEliminacion) ON (j.estado)"
+        )
+        self.execute_query(
+            "CREATE INDEX trabajo_eliminacion_objetivo IF NOT EXISTS "
+            "FOR (j:TrabajoEliminacion) ON (j.objetivo)"
+        )
+
+    def expire_delete_jobs(self):
+        """Borra los trabajos terminados hace más de delete_job_ttl_seconds."""
+        result = self.execute_query("""
+        MATCH (j:TrabajoEliminacion)
+        WHERE j.estado IN ['completado', 'error']
+          AND coalesce(j.finalizado, 0) < timestamp() - $ttl_ms
+        WITH j LIMIT 1000
+        DELETE j
+        RETURN count(j) AS eliminados
+        """, {"ttl_ms": self.delete_job_ttl_seconds * 1000})
+        return result[0]['eliminados'] if result else 0
+
+    def resume_stale_delete_jobs(self):
+        """Retoma, uno a uno, los trabajos cuyo latido lleva más de
+        delete_job_stale_seconds sin avanzar. Devuelve cuántos retomó."""
+        retomados = 0
+        while True:
+            # El primer SET toma el bloqueo del nodo; después se vuelve a
+            # comprobar el latido para que dos workers no reclamen el mismo trabajo
+            result = self.execute_query("""
+            MATCH (j:TrabajoEliminacion)
+            WHERE j.estado IN ['pendiente', 'en_progreso']
+              AND coalesce(j.latido, 0) < timestamp() - $limite_ms
+            WITH j LIMIT 1
+            SET j.reclamado_por = $propietario
+            WITH j
+            WHERE coalesce(j.latido, 0) < timestamp() - $limite_ms
+            SET j.propietario = $propietario,
+                j.latido = timestamp()
+            RETURN j.id AS id, j.tipo AS tipo, j.objetivo AS objetivo,
+                   coalesce(j.relaciones_eliminadas, 0) AS eliminadas
+            """, {"limite_ms": self.delete_job_stale_seconds * 1000, "propietario": self._owner_id()})
+            if not result:
+                return retomados
+            job = result[0]
+            self._run_delete_job(job['id'], job['tipo'], job['objetivo'], job['eliminadas'])
+            retomados += 1
+
+    def start_delete_job_recovery(self):
+        """Lanza el hilo que revisa periódicamente los trabajos abandonados
+        y borra los terminados que ya caducaron.
+
+        Se llama en cada worker después del fork (ver gunicorn.conf.py).
+        """
+        def loop():
+            schema_lista = False
+            while True:
+                try:
+                    if not schema_lista:
+                        self.ensure_activity_schema()
+                        self.ensure_delete_job_schema()
+                        schema_lista = True
+                    self._touch_queued_delete_jobs()
+                    self.resume_stale_delete_jobs()
+                    self.expire_delete_jobs()
+                except Exception:
+                    logger.exception("Error revisando los trabajos de eliminación")
+                time.sleep(max(self.delete_job_stale_seconds / 2, 1))
+
+        threading.Thread(target=loop, daemon=True).start()
@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def _multiplicar(filas, columnas, matriz, n):
+    """Producto de la matriz dispersa de likes por una matriz densa estrecha.
+
+    La matriz dispersa tiene un 1 en cada (filas[i], columnas[i]) y n filas.
+    """
+    # Se trabaja por columnas sobre la traspuesta para que cada lectura sea contigua
+    traspuesta = np.ascontiguousarray(matriz.T)
+    return np.stack([
+        np.bincount(filas, weights=columna[columnas], minlength=n)
+        for columna in traspuesta
+    ], axis=1)
+
+def _run_cpu_bound(fn, *args):
+    # Con GUNICORN_WORKER_CLASS=gevent los "hilos" de fondo son greenlets: un
+    # cálculo largo bloquearía el hub del worker. Se ejecuta en el threadpool
+    # de gevent, que usa hilos reales del sistema
+    try:
+        from gevent import get_hub, monkey
+    except ImportError:
+        return fn(*args)
+    if not monkey.is_module_patched('threading'):
+        return fn(*args)
+    return get_hub().threadpool.apply(fn, args)
+
+class IndexNotReady(Exception):
+    """El índice todavía no se ha construido en este proceso."""
+
+class SimilarityIndex:
+    """Índice en memoria de actividades similares ("a quien le gustó X también le gustó").
+
+    Cada actividad se representa con un vector obtenido por SVD truncada
+    aleatorizada de la matriz dispersa actividades x usuarios de LE_GUSTA (A).
+    A nunca se materializa: solo se multiplica por matrices de pocas columnas
+    a partir de la lista de likes, así que el coste crece con el número de
+    likes y de dimensiones, no con actividades² ni actividades³. Los vecinos
+    más cercanos (coseno)
+    se precalculan al reconstruir el índice, así que una consulta solo lee una
+    lista ya ordenada, sin importar cuántos usuarios marcaron la actividad.
+    """
+    def __init__(self):
+        self.dimensions = int(os.getenv("SIMILARITY_DIMENSIONS", "32"))
+        self.max_neighbors = int(os.getenv("SIMILARITY_MAX_NEIGHBORS", "20"))
+        self.refresh_seconds = int(os.getenv("SIMILARITY_REFRESH_SECONDS", "600"))
+        self.wait_seconds = float(os.getenv("SIMILARITY_WAIT_SECONDS", "10"))
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._started = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._neighbors = None
+        self._categories = {}
+        # Altas y bajas hechas mientras se reconstruye, para repetirlas sobre el índice nuevo
+        self._cambios = None
+
+    def start(self, db):
+        """Construye el índice en un hilo de fondo y lo reconstruye cada
+        refresh_seconds. Se llama en cada worker después del fork (ver
+        gunicorn.conf.py); las llamadas siguientes no hacen nada.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.rebuild(db)
+                except Exception:
+                    logger.exception("No se pudo construir el índice de actividades similares")
+                # Mientras no haya índice se reintenta antes
+                self._stop.wait(self.refresh_seconds if self._ready.is_set() else min(self.refresh_seconds, 10))
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Detiene el hilo de reconstrucción (al terminar la que esté en curso)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def similar(self, db, nombre, k=10):
+        """Devuelve hasta k actividades similares, o None si la actividad no existe o está eliminada.
+
+        Las peticiones nunca construyen el índice: si aún no existe esperan
+        como mucho wait_seconds a que lo termine el hilo de fondo y, si no,
+        lanzan IndexNotReady.
+        """
+        if not self._ready.is_set():
+            # Sin gunicorn (python app.py) no hay post_fork que lo arranque
+            self.start(db)
+            if not self._ready.wait(self.wait_seconds):
+                raise IndexNotReady()
+
+        # add() y remove() solo llegan al worker que atendió la petición: se
+        # comprueba en Neo4j qué candidatos siguen visibles (una búsqueda por
+        # nombre de como mucho max_neighbors + 1 actividades)
+        neighbors = self._neighbors.get(nombre, [])
+        visibles = db.get_visible_activities([nombre] + [vecino for vecino, _ in neighbors])
+        if nombre not in visibles:
+            return None
+        return [
+            {"nombre": vecino, "category": self._categories.get(vecino), "score": score}
+            for vecino, score in neighbors if vecino in visibles
+        ][:k]
+
+    def rebuild(self, db):
+        with self._lock:
+            self._cambios = []
+        try:
+            actividades, likes = db.get_similarity_data()
+            neighbors = _run_cpu_bound(self.compute, actividades, likes)
+            categories = dict(actividades)
+            with self._lock:
+                # Las bajas posteriores a la lectura no deben resucitar al cambiar de índice
+                for cambio in self._cambios:
+                    cambio(neighbors, categories)
+                self._neighbors = neighbors
+                self._categories = categories
+        finally:
+            with self._lock:
+                self._cambios = None
+        self._ready.set()
+
+    def compute(self, actividades, likes):
+        """Calcula los vecinos de cada actividad.
+
+        actividades: lista de (nombre, categoria); likes: lista de (nombre, usuario).
+        """
+        nombres = [nombre for nombre, _ in actividades]
+        if not nombres:
+            return {}
+        n = len(nombres)
+        fila = {nombre: i for i, nombre in enumerate(nombres)}
+        usuarios = {}
+        pares = {
+            (fila[nombre], usuarios.setdefault(usuario, len(usuarios)))
+            for nombre, usuario in likes if nombre in fila
+        }
+        neighbors = {nombre: [] for nombre in nombres}
+        if not pares:
+            return neighbors
+        filas, columnas = (np.array(v, dtype=np.intp) for v in zip(*pares))
+        m = len(usuarios)
+
+        # SVD truncada aleatorizada (Halko et al.): se aproxima el rango de A
+        # con 2·dimensions vectores aleatorios, refinado con cuatro iteraciones
+        # de potencia (los valores singulares de los likes decaen despacio)
+        l = min(2 * self.dimensions, n, m)
+        rng = np.random.default_rng(0)
+        q, _ = np.linalg.qr(_multiplicar(filas, columnas, rng.standard_normal((m, l)), n))
+        for _ in range(4):
+            z, _ = np.linalg.qr(_multiplicar(columnas, filas, q, m))
+            q, _ = np.linalg.qr(_multiplicar(filas, columnas, z, n))
+        # B = Qᵀ·A es pequeña (l x usuarios); su SVD da la de A
+        b = _multiplicar(columnas, filas, q, m).T
+        ub, s, _ = np.linalg.svd(b, full_matrices=False)
+        dims = min(self.dimensions, len(s))
+        embeddings = (q @ ub[:, :dims]) * s[:dims]
+        normas = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = np.divide(embeddings, normas, out=np.zeros_like(embeddings), where=normas > 0)
+
+        k = min(self.max_neighbors, n - 1)
+        if k <= 0:
+            return neighbors
+        # Similitud coseno por bloques para no materializar la matriz n x n completa
+        bloque = 1024
+        for inicio in range(0, n, bloque):
+            sims = embeddings[inicio:inicio + bloque] @ embeddings.T
+            filas_bloque = np.arange(len(sims))
+            sims[filas_bloque, inicio + filas_bloque] = -np.inf
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            valores = np.take_along_axis(sims, top, axis=1)
+            orden = np.argsort(-valores, axis=1)
+            top = np.take_along_axis(top, orden, axis=1)
+            valores = np.take_along_axis(valores, orden, axis=1)
+            for offset in filas_bloque:
+                neighbors[nombres[inicio + offset]] = [
+                    (nombres[j], round(float(v), 4))
+                    for j, v in zip(top[offset], valores[offset]) if v > 0
+                ]
+        return neighbors
+
+    def add(self, nombre, categoria=None):
+        # Una actividad nueva no tiene likes: aparece sin vecinos hasta la próxima reconstrucción
+        def cambio(neighbors, categories):
+            neighbors.setdefault(nombre, [])
+            categories[nombre] = categoria
+        self._apply(cambio)
+
+    def remove(self, nombre):
+        def cambio(neighbors, categories):
+            neighbors.pop(nombre, None)
+            categories.pop(nombre, None)
+            for vecino, lista in neighbors.items():
+                if any(n == nombre for n, _ in lista):
+                    neighbors[vecino] = [(n, s) for n, s in lista if n != nombre]
+        self._apply(cambio)
+
+    def _apply(self, cambio):
+        with self._lock:
+            if self._neighbors is not None:
+                cambio(self._neighbors, self._categories)
+            if self._cambios is not None:
+                self._cambios.append(cambio)
@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import patch, MagicMock
+from flask_jwt_extended import create_access_token
 from app import app as flask_app
+from similarity_index import IndexNotReady
 
 @pytest.fixture
 def client():
@@ -8,6 +10,11 @@ def client():
     with flask_app.test_client() as client:
         yield client
 
+def auth_header(email="test@example.com", rol="usuario"):
+    with flask_app.app_context():
+        token = create_access_token(identity=email, additional_claims={"rol": rol})
+    return {"Authorization": token}
+
 # ---- AUTENTICACIÓN ----
 
 @patch('app.db')
@@ -164,6 +171,115 @@ def test_delete_activity_success(mock_jwt, mock_db, client):
         with client.session_transaction():
             response = client.delete('/api/activities/Act', headers={"Authorization": "Bearer test"})
 
+@patch('app.db')
+def test_delete_activity_accepted(mock_db, client):
+    mock_db.start_delete_job.return_value = "job1"
+    response = client.delete('/api/activities/Act', headers=auth_header("admin@example.com", "admin"))
+    assert response.status_code == 202
+    assert response.json['job_id'] == "job1"
+    mock_db.start_delete_job.assert_called_once_with("actividad", "Act", "admin@example.com")
+
+@patch('app.db')
+def test_delete_activity_not_found(mock_db, client):
+    mock_db.start_delete_job.return_value = None
+    response = client.delete('/api/activities/Act', headers=auth_header("admin@example.com", "admin"))
+    assert response.status_code == 404
+
+@patch('app.db')
+def test_delete_current_user_accepted(mock_db, client):
+    mock_db.start_delete_job.return_value = "job2"
+    response = client.delete('/api/users/me', headers=auth_header())
+    assert response.status_code == 202
+    mock_db.start_delete_job.assert_called_once_with("usuario", "test@example.com", "test@example.com")
+
+@patch('app.db')
+def test_register_user_being_deleted(mock_db, client):
+    mock_db.execute_query.return_value = [{"eliminado": True}]
+    response = client.post('/api/auth/register', json={
+        "name": "Test User",
+        "email": "test@example.com",
+        "password": "password123"
+    })
+    assert response.status_code == 409
+    assert "se está eliminando" in response.json['error']
+
+@patch('app.db')
+def test_like_activity_user_being_deleted(mock_db, client):
+    mock_db.is_being_deleted.return_value = True
+    response = client.post('/api/activities/Act/like', headers=auth_header())
+    assert response.status_code == 409
+    mock_db.is_being_deleted.assert_called_once_with("usuario", "test@example.com")
+    mock_db.execute_query.assert_not_called()
+
+@patch('app.db')
+def test_add_preferences_user_being_deleted(mock_db, client):
+    mock_db.is_being_deleted.return_value = True
+    response = client.post('/api/preferences', json={"actividades": ["Act"]}, headers=auth_header())
+    assert response.status_code == 409
+    mock_db.execute_query.assert_not_called()
+
+@patch('app.db')
+def test_delete_preference_user_being_deleted(mock_db, client):
+    mock_db.is_being_deleted.return_value = True
+    response = client.delete('/api/preferences/Act', headers=auth_header())
+    assert response.status_code == 409
+
+@patch('app.db')
+def test_get_delete_job_owner(mock_db, client):
+    mock_db.get_delete_job.return_value = {"id": "job2", "estado": "en_progreso", "solicitante": "test@example.com"}
+    response = client.get('/api/jobs/job2', headers=auth_header())
+    assert response.status_code == 200
+    assert response.json['data']['estado'] == "en_progreso"
+
+@patch('app.db')
+def test_get_delete_job_other_user(mock_db, client):
+    mock_db.get_delete_job.return_value = {"id": "job2", "estado": "completado", "solicitante": "otro@example.com"}
+    response = client.get('/api/jobs/job2', headers=auth_header())
+    assert response.status_code == 404
+
+@patch('app.similar_index')
+@patch('app.db')
+def test_get_similar_activities_success(mock_db, mock_index, client):
+    mock_index.max_neighbors = 20
+    mock_index.similar.return_value = [{"nombre": "Básquet", "category": "Deportes", "score": 0.9}]
+    response = client.get('/api/activities/Fútbol/similar?k=5')
+    assert response.status_code == 200
+    assert response.json['data'][0]['nombre'] == "Básquet"
+    mock_index.similar.assert_called_once_with(mock_db, "Fútbol", 5)
+
+@patch('app.similar_index')
+@patch('app.db')
+def test_get_similar_activities_not_found(mock_db, mock_index, client):
+    mock_index.max_neighbors = 20
+    mock_index.similar.return_value = None
+    mock_db.execute_query.return_value = []
+    response = client.get('/api/activities/Nada/similar')
+    assert response.status_code == 404
+
+@patch('app.similar_index')
+@patch('app.db')
+def test_get_similar_activities_index_not_ready(mock_db, mock_index, client):
+    mock_index.max_neighbors = 20
+    mock_index.similar.side_effect = IndexNotReady()
+    response = client.get('/api/activities/Fútbol/similar')
+    assert response.status_code == 503
+
+@patch('app.similar_index')
+@patch('app.db')
+def test_get_similar_activities_invalid_k(mock_db, mock_index, client):
+    mock_index.max_neighbors = 20
+    response = client.get('/api/activities/Fútbol/similar?k=0')
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('k', ['abc', '2.5', '-1', '', '21'])
+@patch('app.similar_index')
+@patch('app.db')
+def test_get_similar_activities_rejects_non_integer_k(mock_db, mock_index, client, k):
+    mock_index.max_neighbors = 20
+    response = client.get(f'/api/activities/Fútbol/similar?k={k}')
+    assert response.status_code == 400
+    mock_index.similar.assert_not_called()
+
 # ---- PREFERENCIAS ----
 
 @patch('app.db')
@@ -0,0 +1,298 @@
+import pytest
+import threading
+import time
+from unittest.mock import patch
+from neo4j_crud import neo4jCRUD, SingleFlight
+
+@patch('neo4j_crud.GraphDatabase')
+def test_driver_is_created_lazily(mock_graph):
+    db = neo4jCRUD()
+    mock_graph.driver.assert_not_called()
+    db.execute_query("RETURN 1")
+    mock_graph.driver.assert_called_once()
+
+@patch('neo4j_crud.GraphDatabase')
+def test_driver_is_reused_in_same_process(mock_graph):
+    db = neo4jCRUD()
+    assert db.driver is db.driver
+    mock_graph.driver.assert_called_once()
+
+@patch('neo4j_crud.os.getpid')
+@patch('neo4j_crud.GraphDatabase')
+def test_driver_is_recreated_after_fork(mock_graph, mock_getpid):
+    db = neo4jCRUD()
+    mock_getpid.return_value = 100
+    db.driver
+    mock_getpid.return_value = 101
+    db.driver
+    assert mock_graph.driver.call_count == 2
+
+@patch('neo4j_crud.GraphDatabase')
+def test_reset_drops_inherited_driver_without_closing(mock_graph):
+    db = neo4jCRUD()
+    inherited = db.driver
+    db.reset()
+    db.driver
+    inherited.close.assert_not_called()
+    assert mock_graph.driver.call_count == 2
+
+@patch.dict('neo4j_crud.os.environ', {"NEO4J_MAX_POOL_SIZE": "8"})
+@patch('neo4j_crud.GraphDatabase')
+def test_pool_size_from_env(mock_graph):
+    db = neo4jCRUD()
+    db.driver
+    assert mock_graph.driver.call_args.kwargs['max_connection_pool_size'] == 8
+
+@patch('neo4j_crud.GraphDatabase')
+def test_coalesce_collapses_concurrent_identical_reads(mock_graph):
+    db = neo4jCRUD()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_run(query, parameters=None):
+        calls.append(query)
+        started.set()
+        release.wait(2)
+        return ["record"]
+
+    db._run = slow_run
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(db.execute_query("MATCH (a) RETURN a", {"x": 1}, coalesce=True)))
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait(2)
+    for t in threads[1:]:
+        t.start()
+    deadline = time.time() + 2
+    while db.single_flight.stats()['collapsed'] < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    assert db.single_flight.stats()['collapsed'] == 4
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [["record"]] * 5
+    assert db.single_flight.stats() == {"executed": 1, "collapsed": 4, "in_flight": 0}
+
+def test_single_flight_followers_get_their_own_exception():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    original = ValueError("boom")
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(2)
+        raise original
+
+    def call():
+        try:
+            flight.do("k", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=call)
+    follower.start()
+    deadline = time.time() + 2
+    while flight.stats()['collapsed'] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    leader.join(2)
+    follower.join(2)
+
+    assert len(errors) == 2
+    copia = next(e for e in errors if e is not original)
+    assert copia.args == ("boom",)
+    assert copia.__cause__ is original
+
+@patch('neo4j_crud.GraphDatabase')
+def test_coalesce_keys_on_parameters(mock_graph):
+    db = neo4jCRUD()
+    calls = []
+    db._run = lambda query, parameters=None: calls.append(parameters) or []
+    db.execute_query("MATCH (a) RETURN a", {"email": "a@example.com"}, coalesce=True)
+    db.execute_query("MATCH (a) RETURN a", {"email": "b@example.com"}, coalesce=True)
+    assert len(calls) == 2
+    assert db.single_flight.stats()['collapsed'] == 0
+
+def test_single_flight_propagates_errors_and_clears_key():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: [1]) == [1]
+    assert flight.stats()['in_flight'] == 0
+
+@patch('neo4j_crud.GraphDatabase')
+def test_execute_query_without_coalesce_skips_single_flight(mock_graph):
+    db = neo4jCRUD()
+    db._run = lambda query, parameters=None: []
+    db.execute_query("MATCH (a) RETURN a")
+    assert db.single_flight.stats()['executed'] == 0
+
+@patch('neo4j_crud.GraphDatabase')
+def test_start_delete_job_returns_none_when_missing(mock_graph):
+    db = neo4jCRUD()
+    db._run = lambda query, parameters=None: []
+    assert db.start_delete_job("actividad", "Nada", "admin@example.com") is None
+
+@patch('neo4j_crud.GraphDatabase')
+def test_delete_job_removes_relationships_in_batches(mock_graph):
+    db = neo4jCRUD()
+    db.delete_batch_size = 2
+    lotes = [2, 2, 1, 0]
+    queries = []
+
+    def fake_run(query, parameters=None):
+        queries.append((query, parameters))
+        if "DELETE r" in query:
+            return [{"eliminadas": lotes.pop(0)}]
+        return []
+
+    db._run = fake_run
+    db._run_delete_job("job1", "actividad", "Fútbol")
+
+    batch_queries = [p for q, p in queries if "DELETE r" in q]
+    assert len(batch_queries) == 4
+    assert all(p["batch"] == 2 for p in batch_queries)
+    assert any("DETACH DELETE n" in q for q, _ in queries)
+    final = queries[-1][1]
+    assert final["estado"] == "completado"
+    assert final["eliminadas"] == 5
+
+@patch('neo4j_crud.threading.Thread')
+@patch('neo4j_crud.GraphDatabase')
+def test_start_delete_job_returns_existing_job(mock_graph, mock_thread):
+    db = neo4jCRUD()
+    db._run = lambda query, parameters=None: [{"id": "anterior", "nuevo": False}]
+    assert db.start_delete_job("actividad", "Fútbol", "admin@example.com") == "anterior"
+    mock_thread.assert_not_called()
+
+@patch('neo4j_crud.threading.Thread')
+@patch('neo4j_crud.GraphDatabase')
+def test_start_delete_job_enqueues_new_job(mock_graph, mock_thread):
+    db = neo4jCRUD()
+    db._run = lambda query, parameters=None: [{"id": parameters["id"], "nuevo": True}]
+    job_id = db.start_delete_job("actividad", "Fútbol", "admin@example.com")
+    db.start_delete_job("actividad", "Básquet", "admin@example.com")
+    # Un solo hilo por worker, alimentado por la cola
+    mock_thread.return_value.start.assert_called_once()
+    assert db._jobs.get_nowait() == (job_id, "actividad", "Fútbol")
+    assert db._jobs.qsize() == 1
+    assert job_id in db._queued_jobs
+
+@patch('neo4j_crud.GraphDatabase')
+def test_delete_jobs_run_one_at_a_time(mock_graph):
+    db = neo4jCRUD()
+    activos = []
+    maximo = []
+    terminados = threading.Event()
+
+    def fake_job(job_id, tipo, valor):
+        activos.append(job_id)
+        maximo.append(len(activos))
+        time.sleep(0.01)
+        activos.remove(job_id)
+        if job_id == "job4":
+            terminados.set()
+
+    db._run_delete_job = fake_job
+    for i in range(5):
+        db._enqueue_delete_job(f"job{i}", "actividad", f"act{i}")
+    assert terminados.wait(2)
+    assert max(maximo) == 1
+    assert not db._queued_jobs
+
+@patch('neo4j_crud.threading.Thread')
+@patch('neo4j_crud.GraphDatabase')
+def test_touch_queued_delete_jobs(mock_graph, mock_thread):
+    db = neo4jCRUD()
+    calls = []
+    db._run = lambda query, parameters=None: calls.append(parameters) or []
+    db._enqueue_delete_job("job1", "actividad", "Fútbol")
+    db._touch_queued_delete_jobs()
+    assert calls == [{"ids": ["job1"]}]
+
+@patch('neo4j_crud.GraphDatabase')
+def test_resume_stale_delete_jobs_continues_count(mock_graph):
+    db = neo4jCRUD()
+    reclamos = [[{"id": "job1", "tipo": "actividad", "objetivo": "Fútbol", "eliminadas": 7}], []]
+    runs = []
+    db._run = lambda query, parameters=None: reclamos.pop(0)
+    db._run_delete_job = lambda *args: runs.append(args)
+    assert db.resume_stale_delete_jobs() == 1
+    assert runs == [("job1", "actividad", "Fútbol", 7)]
+
+@patch('neo4j_crud.GraphDatabase')
+def test_delete_job_records_error(mock_graph):
+    db = neo4jCRUD()
+    updates = []
+
+    def fake_run(query, parameters=None):
+        if "DELETE r" in query:
+            raise RuntimeError("timeout")
+        if "TrabajoEliminacion" in query:
+            updates.append(parameters)
+        return []
+
+    db._run = fake_run
+    db._run_delete_job("job1", "usuario", "test@example.com")
+    assert updates[-1]["estado"] == "error"
+    assert updates[-1]["error"] == "timeout"
+
+@patch('neo4j_crud.GraphDatabase')
+def test_delete_job_survives_failing_error_update(mock_graph):
+    db = neo4jCRUD()
+
+    def fake_run(query, parameters=None):
+        if "DELETE r" in query or "SET j.estado" in query and parameters["estado"] == "error":
+            raise RuntimeError("neo4j caído")
+        return []
+
+    db._run = fake_run
+    db._run_delete_job("job1", "actividad", "Fútbol")
+
+@patch('neo4j_crud.GraphDatabase')
+def test_ensure_delete_job_schema_creates_unique_id(mock_graph):
+    db = neo4jCRUD()
+    queries = []
+    db._run = lambda query, parameters=None: queries.append(query) or []
+    db.ensure_delete_job_schema()
+    assert any("REQUIRE j.id IS UNIQUE" in q for q in queries)
+
+@patch('neo4j_crud.GraphDatabase')
+def test_expire_delete_jobs_uses_ttl(mock_graph):
+    db = neo4jCRUD()
+    db.delete_job_ttl_seconds = 60
+    calls = []
+    db._run = lambda query, parameters=None: calls.append(parameters) or [{"eliminados": 3}]
+    assert db.expire_delete_jobs() == 3
+    assert calls[0] == {"ttl_ms": 60000}
+
+@patch('neo4j_crud.GraphDatabase')
+def test_ensure_activity_schema_falls_back_to_index(mock_graph):
+    db = neo4jCRUD()
+    queries = []
+
+    def fake_run(query, parameters=None):
+        queries.append(query)
+        if "CONSTRAINT" in query:
+            raise RuntimeError("nombres duplicados")
+        return []
+
+    db._run = fake_run
+    db.ensure_activity_schema()
+    assert "REQUIRE a.nombre IS UNIQUE" in queries[0]
+    assert "CREATE INDEX actividad_nombre_idx" in queries[1]
+
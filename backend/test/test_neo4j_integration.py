@@ -0,0 +1,133 @@
+# Pruebas contra un Neo4j real: ejecutan el Cypher de los trabajos de
+# eliminación. Se omiten si NEO4J_URI no está configurado o el servidor no
+# responde. Todos los nodos
+# que crean llevan un prefijo único y se borran al terminar.
+import os
+import threading
+import uuid
+import pytest
+from unittest.mock import patch
+from neo4j_crud import neo4jCRUD
+
+pytestmark = pytest.mark.skipif(not os.getenv("NEO4J_URI"), reason="NEO4J_URI no configurado")
+
+@pytest.fixture(scope="module")
+def neo4j_disponible():
+    db = neo4jCRUD()
+    try:
+        db.driver.verify_connectivity()
+    except Exception as e:
+        pytest.skip(f"Neo4j no disponible en {db.uri}: {e}")
+    finally:
+        db.close()
+
+@pytest.fixture
+def prefijo():
+    return f"test-{uuid.uuid4().hex[:8]}-"
+
+@pytest.fixture
+def db(neo4j_disponible, prefijo):
+    db = neo4jCRUD()
+    yield db
+    db.execute_query("""
+    MATCH (n)
+    WHERE (n:Actividad AND n.nombre STARTS WITH $p)
+       OR (n:Usuario AND n.email STARTS WITH $p)
+       OR (n:TrabajoEliminacion AND (n.objetivo STARTS WITH $p OR n.id STARTS WITH $p))
+    DETACH DELETE n
+    """, {"p": prefijo})
+    db.close()
+
+def crear_actividad_con_likes(db, prefijo, likes):
+    nombre = prefijo + "actividad"
+    db.execute_query("""
+    CREATE (a:Actividad {nombre: $nombre})
+    WITH a
+    UNWIND range(1, $likes) AS i
+    CREATE (:Usuario {email: $p + 'u' + toString(i)})-[:LE_GUSTA]->(a)
+    """, {"nombre": nombre, "likes": likes, "p": prefijo})
+    return nombre
+
+def crear_trabajo(db, job_id, objetivo, latido):
+    db.execute_query("""
+    CREATE (:TrabajoEliminacion {
+        id: $id, tipo: 'actividad', objetivo: $objetivo, estado: 'en_progreso',
+        relaciones_eliminadas: 3, propietario: 'muerto:1', latido: $latido
+    })
+    """, {"id": job_id, "objetivo": objetivo, "latido": latido})
+
+def test_schema_is_idempotent(db):
+    for _ in range(2):
+        db.ensure_activity_schema()
+        db.ensure_delete_job_schema()
+    indices = db.execute_query("SHOW INDEXES YIELD labelsOrTypes, properties RETURN labelsOrTypes, properties")
+    assert any(r["labelsOrTypes"] == ["Actividad"] and r["properties"] == ["nombre"] for r in indices)
+
+def test_start_delete_job_tombstones_and_reuses_active_job(db, prefijo):
+    nombre = crear_actividad_con_likes(db, prefijo, 3)
+    with patch.object(db, '_enqueue_delete_job') as enqueue:
+        job_id = db.start_delete_job("actividad", nombre, "admin@example.com")
+        assert db.start_delete_job("actividad", nombre, "admin@example.com") == job_id
+    enqueue.assert_called_once_with(job_id, "actividad", nombre)
+    assert db.is_being_deleted("actividad", nombre)
+    assert db.get_delete_job(job_id)["estado"] == "pendiente"
+    assert db.start_delete_job("actividad", prefijo + "no-existe", "admin@example.com") is None
+
+def test_batch_delete_removes_relationships_then_node(db, prefijo):
+    nombre = crear_actividad_con_likes(db, prefijo, 5)
+    db.delete_batch_size = 2
+    with patch.object(db, '_enqueue_delete_job'):
+        job_id = db.start_delete_job("actividad", nombre, "admin@example.com")
+    db._run_delete_job(job_id, "actividad", nombre)
+
+    job = db.get_delete_job(job_id)
+    assert job["estado"] == "completado"
+    assert job["relaciones_eliminadas"] == 5
+    assert job["finalizado"] is not None
+    assert not db.execute_query("MATCH (a:Actividad {nombre: $n}) RETURN a", {"n": nombre})
+    usuarios = db.execute_query(
+        "MATCH (u:Usuario) WHERE u.email STARTS WITH $p RETURN count(u) AS total", {"p": prefijo}
+    )
+    assert usuarios[0]["total"] == 5
+
+def test_resume_claims_only_stale_jobs(db, prefijo):
+    viejo, reciente = prefijo + "viejo", prefijo + "reciente"
+    crear_trabajo(db, viejo, prefijo + "a1", 0)
+    db.execute_query("""
+    CREATE (:TrabajoEliminacion {
+        id: $id, tipo: 'actividad', objetivo: $objetivo, estado: 'en_progreso',
+        relaciones_eliminadas: 0, propietario: 'vivo:1', latido: timestamp()
+    })
+    """, {"id": reciente, "objetivo": prefijo + "a2"})
+    db.delete_job_stale_seconds = 60
+    ejecutados = []
+    with patch.object(db, '_run_delete_job', side_effect=lambda *args: ejecutados.append(args)):
+        db.resume_stale_delete_jobs()
+
+    ids = [args[0] for args in ejecutados]
+    assert (viejo, "actividad", prefijo + "a1", 3) in ejecutados
+    assert reciente not in ids
+    assert db.get_delete_job(viejo)["propietario"] == db._owner_id()
+    assert db.get_delete_job(reciente)["propietario"] == "vivo:1"
+
+def test_concurrent_resume_claims_each_job_once(db, prefijo):
+    job_id = prefijo + "disputado"
+    crear_trabajo(db, job_id, prefijo + "a1", 0)
+    otro = neo4jCRUD()
+    ejecutados = []
+    barrera = threading.Barrier(2)
+
+    def reclamar(instancia):
+        with patch.object(instancia, '_run_delete_job', side_effect=lambda *args: ejecutados.append(args[0])):
+            barrera.wait(5)
+            instancia.resume_stale_delete_jobs()
+
+    try:
+        hilos = [threading.Thread(target=reclamar, args=(i,)) for i in (db, otro)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join(30)
+    finally:
+        otro.close()
+    assert ejecutados.count(job_id) == 1
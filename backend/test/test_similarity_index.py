@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+import threading
+from unittest.mock import MagicMock
+from similarity_index import SimilarityIndex, IndexNotReady
+
+ACTIVIDADES = [("Fútbol", "Deportes"), ("Básquet", "Deportes"), ("Ajedrez", "Juegos"), ("Coro", "Música")]
+LIKES = [
+    ("Fútbol", "a"), ("Básquet", "a"),
+    ("Fútbol", "b"), ("Básquet", "b"),
+    ("Fútbol", "c"), ("Ajedrez", "c"),
+    ("Ajedrez", "d")
+]
+
+@pytest.fixture
+def crear_indice():
+    # Los índices que arrancan su hilo de reconstrucción se detienen al terminar cada prueba
+    creados = []
+
+    def crear():
+        index = SimilarityIndex()
+        creados.append(index)
+        return index
+
+    yield crear
+    for index in creados:
+        index.stop(timeout=5)
+        assert index._thread is None or not index._thread.is_alive()
+
+def make_db(visibles=None):
+    visibles = set(visibles if visibles is not None else [n for n, _ in ACTIVIDADES])
+    db = MagicMock()
+    db.get_similarity_data.return_value = (ACTIVIDADES, LIKES)
+    db.get_visible_activities.side_effect = lambda nombres: visibles & set(nombres)
+    return db
+
+def test_compute_ranks_co_liked_activities_first():
+    neighbors = SimilarityIndex().compute(ACTIVIDADES, LIKES)
+    assert neighbors["Fútbol"][0][0] == "Básquet"
+    assert all(n != "Fútbol" for n, _ in neighbors["Fútbol"])
+
+def test_compute_matches_svd_of_like_matrix():
+    rng = np.random.default_rng(0)
+    nombres = [f"act{i}" for i in range(12)]
+    matriz = rng.random((12, 40)) < 0.3
+    likes = [(nombres[i], f"u{j}") for i, j in zip(*np.nonzero(matriz))]
+    index = SimilarityIndex()
+    # Con 2·6 = 12 vectores aleatorios se cubre todo el rango de A: la SVD aleatorizada es exacta
+    index.dimensions = 6
+    neighbors = index.compute([(n, None) for n in nombres], likes)
+
+    u, s, _ = np.linalg.svd(matriz.astype(float), full_matrices=False)
+    esperado = u[:, :6] * s[:6]
+    esperado /= np.linalg.norm(esperado, axis=1, keepdims=True)
+    sims = esperado @ esperado.T
+    for i, nombre in enumerate(nombres):
+        for vecino, score in neighbors[nombre]:
+            assert abs(score - sims[i, nombres.index(vecino)]) < 1e-3
+
+def test_compute_activity_without_likes_has_no_neighbors():
+    neighbors = SimilarityIndex().compute(ACTIVIDADES, LIKES)
+    assert neighbors["Coro"] == []
+    assert all(n != "Coro" for n, _ in neighbors["Fútbol"])
+
+def test_compute_without_likes():
+    neighbors = SimilarityIndex().compute(ACTIVIDADES, [])
+    assert neighbors == {nombre: [] for nombre, _ in ACTIVIDADES}
+
+def test_similar_builds_once_and_limits_k(crear_indice):
+    db = make_db()
+    index = crear_indice()
+    result = index.similar(db, "Fútbol", k=1)
+    index.similar(db, "Básquet", k=1)
+    assert len(result) == 1
+    assert result[0]["nombre"] == "Básquet"
+    assert result[0]["category"] == "Deportes"
+    db.get_similarity_data.assert_called_once()
+
+def test_concurrent_first_requests_build_once(crear_indice):
+    db = make_db()
+    release = threading.Event()
+
+    def slow_data():
+        release.wait(2)
+        return ACTIVIDADES, LIKES
+
+    db.get_similarity_data.side_effect = slow_data
+    index = crear_indice()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(index.similar(db, "Fútbol"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(results) == 5
+    db.get_similarity_data.assert_called_once()
+
+def test_similar_raises_while_index_is_not_ready(crear_indice):
+    db = make_db()
+    release = threading.Event()
+    db.get_similarity_data.side_effect = lambda: release.wait(2) and (ACTIVIDADES, LIKES)
+    index = crear_indice()
+    index.wait_seconds = 0.05
+    try:
+        with pytest.raises(IndexNotReady):
+            index.similar(db, "Fútbol")
+    finally:
+        release.set()
+
+def test_similar_unknown_activity(crear_indice):
+    assert crear_indice().similar(make_db(), "Nada") is None
+
+def test_add_and_remove_patch_index(crear_indice):
+    db = make_db([n for n, _ in ACTIVIDADES] + ["Teatro"])
+    index = crear_indice()
+    index.rebuild(db)
+    index.add("Teatro", "Arte")
+    assert index.similar(db, "Teatro") == []
+    index.remove("Básquet")
+    assert "Básquet" not in index._neighbors
+    assert all(r["nombre"] != "Básquet" for r in index.similar(db, "Fútbol"))
+
+def test_similar_skips_activities_deleted_by_other_workers(crear_indice):
+    db = make_db(["Fútbol", "Ajedrez", "Coro"])
+    index = crear_indice()
+    index.rebuild(db)
+    nombres = [r["nombre"] for r in index.similar(db, "Fútbol")]
+    assert "Básquet" not in nombres
+    assert "Ajedrez" in nombres
+
+def test_similar_deleted_source_activity(crear_indice):
+    db = make_db(["Básquet"])
+    index = crear_indice()
+    index.rebuild(db)
+    assert index.similar(db, "Fútbol") is None
+
+def test_created_in_other_worker_has_no_neighbors(crear_indice):
+    db = make_db([n for n, _ in ACTIVIDADES] + ["Teatro"])
+    index = crear_indice()
+    index.rebuild(db)
+    assert index.similar(db, "Teatro") == []
+
+def test_remove_during_rebuild_is_reapplied(crear_indice):
+    db = make_db()
+    index = crear_indice()
+    index.rebuild(db)
+
+    def data_then_delete():
+        # La baja llega después de leer los datos y antes de cambiar de índice
+        index.remove("Básquet")
+        return ACTIVIDADES, LIKES
+
+    db.get_similarity_data.side_effect = data_then_delete
+    index.rebuild(db)
+    assert "Básquet" not in index._neighbors
+    assert all(n != "Básquet" for n, _ in index._neighbors["Fútbol"])
+